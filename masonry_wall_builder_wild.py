@@ -22,6 +22,8 @@ STRIDE_HEIGHT = 1300          # Robot's vertical reach
 # Calculate the number of courses (rows of bricks)
 NUM_COURSES = int(WALL_HEIGHT // COURSE_HEIGHT)
 
+MAX_STAGGERED_STEPS = 6       # Maximum consecutive courses with the same shift
+
 def generate_random_color():
     # Generate a random hex color code
     return "#{:06x}".format(random.randint(0, 0xFFFFFF))
@@ -49,13 +51,18 @@ def generate_valid_course_patterns(wall_width):
                     patterns.append(list(combination))
     return patterns
 
-def is_pattern_valid(pattern, previous_joints):
-    # Check if the pattern is valid against the constraints
-    current_joints = []
+def compute_joints(pattern):
+    # Compute the head joint positions of a pattern (excluding the last brick)
+    joints = []
     x = 0
-    for length in pattern[:-1]:  # Exclude the last brick to avoid extra head joint
+    for length in pattern[:-1]:
         x += length + HEAD_JOINT
-        current_joints.append(x)
+        joints.append(x)
+    return joints
+
+def is_pattern_valid(pattern, previous_joints):
+    # Check if the pattern is valid against the constraints
+    current_joints = compute_joints(pattern)
 
     # Constraint 1: No two head joints directly on top of each other
     for cj in current_joints:
@@ -88,6 +95,152 @@ def compute_shift(current_pattern, previous_pattern):
     shift = x_current - x_previous
     return shift
 
+def build_alias_table(weights):
+    # Build a Vose alias table for sampling indices proportionally to the weights
+    n = len(weights)
+    total = sum(weights)
+    probabilities = [w * n / total for w in weights]
+    alias = [0] * n
+    small = [i for i, p in enumerate(probabilities) if p < 1.0]
+    large = [i for i, p in enumerate(probabilities) if p >= 1.0]
+    while small and large:
+        s = small.pop()
+        l = large.pop()
+        alias[s] = l
+        probabilities[l] -= 1.0 - probabilities[s]
+        if probabilities[l] < 1.0:
+            small.append(l)
+        else:
+            large.append(l)
+    # Leftovers only differ from 1 by rounding errors
+    for i in small + large:
+        probabilities[i] = 1.0
+    return probabilities, alias
+
+def sample_alias_table(table, rng=random):
+    # Draw one index from an alias table in constant time
+    probabilities, alias = table
+    i = rng.randrange(len(probabilities))
+    return i if rng.random() < probabilities[i] else alias[i]
+
+class CourseTransitionGraph:
+    # Graph of which course patterns may be laid on top of which for a given wall width.
+    # A state is (pattern index, shift from the previous course, staggered steps counter),
+    # so the stagger constraint is tracked by the walk rather than re-checked per course.
+    def __init__(self, wall_width):
+        self.wall_width = wall_width
+        self.patterns = generate_valid_course_patterns(wall_width)
+        self.adjacency = self._build_adjacency()   # Pattern index -> [(next index, shift)]
+        self.start_states = [(i, 0, 1) for i in range(len(self.patterns))]
+        self.state_successors = self._build_state_successors()
+        self._completion_counts = [dict.fromkeys(self.state_successors, 1)]  # Walks of h more courses
+        self._alias_tables = {}           # (state, remaining courses) -> (candidates, alias table)
+
+    def _build_adjacency(self):
+        # Precompute the patterns that may follow each pattern
+        joints = [compute_joints(pattern) for pattern in self.patterns]
+        joint_sets = [set(j) for j in joints]
+        adjacency = []
+        for i, previous_pattern in enumerate(self.patterns):
+            successors = []
+            for j, pattern in enumerate(self.patterns):
+                # Cheap set test first, then the exact constraint check
+                if joint_sets[i].isdisjoint(joint_sets[j]) and is_pattern_valid(pattern, joints[i]):
+                    successors.append((j, compute_shift(pattern, previous_pattern)))
+            adjacency.append(successors)
+        return adjacency
+
+    def _next_states(self, state):
+        # Expand the pattern adjacency with the staggered steps counter
+        pattern_index, previous_shift, counter = state
+        next_states = []
+        for next_index, shift in self.adjacency[pattern_index]:
+            next_counter = counter + 1 if abs(shift - previous_shift) < 1e-6 else 1
+            if next_counter <= MAX_STAGGERED_STEPS:
+                next_states.append((next_index, shift, next_counter))
+        return next_states
+
+    def _build_state_successors(self):
+        # Enumerate every state reachable from the first course
+        state_successors = {}
+        pending = list(self.start_states)
+        while pending:
+            state = pending.pop()
+            if state in state_successors:
+                continue
+            state_successors[state] = self._next_states(state)
+            pending.extend(state_successors[state])
+        return state_successors
+
+    def dead_end_patterns(self):
+        # Patterns that no other pattern may be laid on top of
+        return [self.patterns[i] for i, successors in enumerate(self.adjacency) if not successors]
+
+    def completion_count(self, state, remaining):
+        # Number of valid ways to lay `remaining` more courses on top of the state
+        while len(self._completion_counts) <= remaining:
+            counts = self._completion_counts[-1]
+            self._completion_counts.append({
+                s: sum(counts[n] for n in successors)
+                for s, successors in self.state_successors.items()
+            })
+        return self._completion_counts[remaining][state]
+
+    def count_walls(self, num_courses):
+        # Number of distinct valid walls with the given number of courses
+        if num_courses == 0:
+            return 1
+        return sum(self.completion_count(s, num_courses - 1) for s in self.start_states)
+
+    def enumerate_walls(self, num_courses):
+        # Yield every valid wall as a list of patterns, bottom course first
+        if num_courses == 0:
+            yield []
+            return
+        stack = [(s, [s]) for s in reversed(self.start_states)]
+        while stack:
+            state, walk = stack.pop()
+            if self.completion_count(state, num_courses - len(walk)) == 0:
+                continue  # Prune states that cannot reach the full height
+            if len(walk) == num_courses:
+                yield [self.patterns[s[0]] for s in walk]
+                continue
+            for next_state in reversed(self.state_successors[state]):
+                stack.append((next_state, walk + [next_state]))
+
+    def _alias_table(self, state, remaining):
+        # Alias table over the candidates for the next course, weighted by completions
+        key = (state, remaining)
+        if key not in self._alias_tables:
+            candidates = self.start_states if state is None else self.state_successors[state]
+            if candidates:
+                weights = [self.completion_count(c, remaining - 1) for c in candidates]
+                if not any(weights):
+                    weights = [1] * len(candidates)  # No full-height wall, keep going as far as possible
+                self._alias_tables[key] = (candidates, build_alias_table(weights))
+            else:
+                self._alias_tables[key] = (candidates, None)
+        return self._alias_tables[key]
+
+    def random_walk(self, num_courses, rng=random):
+        # Yield one state per course, or None when a course cannot be laid
+        state = None
+        for course_number in range(num_courses):
+            candidates, table = self._alias_table(state, num_courses - course_number)
+            if table is None:
+                state = None  # Dead end, restart the next course from scratch
+            else:
+                state = candidates[sample_alias_table(table, rng)]
+            yield state
+
+_transition_graphs = {}  # Cache of transition graphs per wall width
+
+def get_course_transition_graph(wall_width):
+    # Return the transition graph for the wall width, building it only once
+    if wall_width not in _transition_graphs:
+        _transition_graphs[wall_width] = CourseTransitionGraph(wall_width)
+    return _transition_graphs[wall_width]
+
 class Brick:
     # Class representing a single brick
     def __init__(self, x, y, length, is_built=False, stride=0):
@@ -122,62 +275,23 @@ class Wall:
 
     def calculate_bricks(self):
         # Calculate the positions and sizes of all bricks in the wall
-        valid_patterns = generate_valid_course_patterns(WALL_WIDTH)
-        if not valid_patterns:
+        graph = get_course_transition_graph(WALL_WIDTH)
+        if not graph.patterns:
             messagebox.showerror("Error", "No valid patterns could be generated for the wall width.")
             return
 
         y = WALL_HEIGHT - BRICK_HEIGHT  # Start from the bottom (excluding bed joints in drawing)
-        previous_course_joints = []
-        previous_course_pattern = None
-        for course_number in range(NUM_COURSES):
-            random.shuffle(valid_patterns)  # Randomize patterns to maintain randomness
-            pattern_found = False
-            for pattern in valid_patterns:
-                # Compute current shift
-                if previous_course_pattern is not None:
-                    current_shift = compute_shift(pattern, previous_course_pattern)
-                    if abs(current_shift - self.previous_shift) < 1e-6:
-                        attempted_staggered_steps_counter = self.staggered_steps_counter + 1
-                    else:
-                        attempted_staggered_steps_counter = 1
-                else:
-                    current_shift = 0  # First course, shift is 0
-                    attempted_staggered_steps_counter = 1
-
-                if attempted_staggered_steps_counter > 6:
-                    continue  # Skip this pattern, shift has occurred too many times
-
-                # Check if pattern is valid
-                is_valid = is_pattern_valid(pattern, previous_course_joints)
-
-                if is_valid:
-                    # Accept the pattern
-                    self.staggered_steps_counter = attempted_staggered_steps_counter
-                    self.previous_shift = current_shift
-                    previous_course_pattern = pattern
-
-                    bricks_in_course = create_bricks_from_pattern(pattern, y)
-                    # Record current course head joint positions
-                    current_course_joints = []
-                    x = 0
-                    for length in pattern[:-1]:  # Exclude the last brick to avoid extra head joint
-                        x += length + HEAD_JOINT
-                        current_course_joints.append(x)
-                    # Update previous_course_joints
-                    previous_course_joints = current_course_joints
-                    # Add bricks to the wall
-                    self.bricks.extend(bricks_in_course)
-                    pattern_found = True
-                    break
-            if not pattern_found:
-                # If no valid pattern is found, report and proceed
+        # Sample the courses as a random walk over the precomputed transition graph
+        for course_number, state in enumerate(graph.random_walk(NUM_COURSES)):
+            if state is None:
+                # If no valid pattern is found, report and proceed without adding bricks
                 print(f"Unable to find a valid pattern for course {course_number + 1}")
-                # For simplicity, we'll proceed without adding bricks
-                previous_course_joints = []  # Reset to allow next course to generate
                 self.staggered_steps_counter = 1  # Reset counter
                 self.previous_shift = 0
-                previous_course_pattern = None
+            else:
+                pattern_index, self.previous_shift, self.staggered_steps_counter = state
+                pattern = graph.patterns[pattern_index]
+                self.bricks.extend(create_bricks_from_pattern(pattern, y))
             y -= COURSE_HEIGHT  # Move up to the next course (including bed joints in calculation)
 
     def optimize_build_order(self):